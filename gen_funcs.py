@@ -1,6 +1,5 @@
 from qiskit_experiments.library.tomography import ProcessTomography, MitigatedProcessTomography, StateTomography, MitigatedStateTomography
 from qiskit_experiments.framework import ParallelExperiment, BatchExperiment
-from numpy import arange
 from qiskit import QuantumCircuit
 
 
@@ -16,11 +15,13 @@ def gen_circ_ls(base_qc: QuantumCircuit, num_partitions: int):
     qc_ls: list of quantum circuits that are repititions of base circuits
     '''
 
+    # repeat(i).decompose(reps=1) is i copies of base_qc's instructions, so
+    # append one more copy of base_qc per step instead of rebuilding
     qc_ls = []
+    curr_qc = QuantumCircuit(*base_qc.qregs, *base_qc.cregs)
     for i in range(1, num_partitions+1):
-        curr_qc = base_qc.repeat(i)
-        curr_qc = curr_qc.decompose(reps=1)
-        qc_ls.append(curr_qc)
+        curr_qc.compose(base_qc, inplace=True)
+        qc_ls.append(curr_qc.copy(name=f'{base_qc.name}**{i}'))
     return qc_ls
 
 
@@ -40,46 +41,104 @@ def gen_qubit_ls(total_qubits: int, num_qubit: int, repeat: bool):
     [[0, 1], [2, 3], [4, 5], ...]
     '''
 
-    qubit_arr = arange(0, total_qubits)
-    qubit_arr = [qubit_arr[i:i+num_qubit] for i in range(0, len(qubit_arr),
-                                                         num_qubit)]
-    qubit_ls = [ls.tolist() for ls in qubit_arr]
+    qubit_ls = [list(range(i, min(i+num_qubit, total_qubits)))
+                for i in range(0, total_qubits, num_qubit)]
     if repeat:
         qubit_ls.extend(qubit_ls)
     return qubit_ls
 
 
+def _make_exp(qc: QuantumCircuit, backend, qubits: list, mitigation=False,
+              analysis='default', state_tom=False):
+
+    ''' builds the tomography experiment of a circuit on the given qubits.
+    Every call returns a new experiment, so experiments are never shared
+    between composite experiments.
+
+    inputs:
+    qc: quantum circuit to perform tomography on
+    backend
+    qubits: physical qubits the experiment runs on
+    mitigation: whether to use the readout error mitigated tomography
+    analysis: analysis method provided by qiskit_experiment
+    state_tom: whether to perform state tomography instead of QPT
+
+    returns:
+    exp: the tomography experiment
+    '''
+
+    if mitigation and not state_tom:
+        exp = MitigatedProcessTomography(qc, backend, physical_qubits=qubits,
+                                         analysis=analysis)
+    elif not mitigation and not state_tom:
+        exp = ProcessTomography(qc, backend, physical_qubits=qubits,
+                                analysis=analysis)
+    elif not mitigation and state_tom:
+        exp = StateTomography(qc, backend, physical_qubits=qubits,
+                              analysis=analysis)
+    else:
+        exp = MitigatedStateTomography(qc, backend, physical_qubits=qubits,
+                                       analysis=analysis)
+    return exp
+
+
 def batch_2_parallel_exp_2q(qc_ls: list, backend, qubit_ls: list,
-                            analysis='default'):
+                            analysis='default', num_groups=2):
 
-    ''' generates a BatchExperiment object that contains two parallel
-    experiments. This generation of experiments can only be used by
-    2-qubit systems on 127 qubit devices.
+    ''' generates a BatchExperiment object that contains num_groups parallel
+    experiments. This generation of experiments is meant for 2-qubit
+    systems on 127 qubit devices.
 
     inputs:
     qc_ls: list of quantum circuits that are repeated sequences
     backend
     qubit_ls: list of qubits generated from gen_qubit_ls with repeat=True
     analysis: analysis method provided by qiskit_experiment
-
-    We create a parallel circuit of half of the QPTs, those experiments
-    run for 144 circuits. The other 144 circuits performs QPT for the
-    second half of maps. We then return those experiment ready to be
-    run.
+    num_groups: number of parallel experiments to split the QPTs into
+
+    We split the QPTs into num_groups consecutive groups whose sizes differ
+    by at most one and create a parallel experiment for each, so no group
+    takes much longer than the others on the device. With the default of
+    two groups, the first half of the maps runs in one parallel experiment
+    and the second half in the other. We then return those experiments
+    ready to be run.
+
+    The experiments within a group run in parallel, so the qubits they use
+    must be disjoint, otherwise a ValueError is raised. With qubit_ls from
+    gen_qubit_ls with repeat=True, this means a group can hold at most
+    len(qubit_ls) // 2 experiments.
     '''
 
+    if num_groups < 1:
+        raise ValueError("num_groups must be at least 1")
+    if len(qc_ls) < num_groups:
+        raise ValueError("qc_ls must hold at least num_groups circuits")
+
+    # the first len(qc_ls) % num_groups groups take one extra experiment
+    group_size, remainder = divmod(len(qc_ls), num_groups)
+    group_bounds = []
+    start = 0
+    for i in range(num_groups):
+        end = start + group_size + (i < remainder)
+        group_qubits = [q for qubits in qubit_ls[start: end] for q in qubits]
+        if len(group_qubits) != len(set(group_qubits)):
+            raise ValueError("Experiments in a parallel group share qubits. "
+                             "Increase num_groups so that each group holds "
+                             "at most len(qubit_ls) // 2 experiments")
+        group_bounds.append((start, end))
+        start = end
+
     exp_ls = []
     for i in range(len(qc_ls)):
         curr_qc = qc_ls[i]
         curr_qubits_used = qubit_ls[i]
-        curr_exp = ProcessTomography(curr_qc, backend,
-                                     physical_qubits=curr_qubits_used,
-                                     analysis=analysis)
+        curr_exp = _make_exp(curr_qc, backend, curr_qubits_used,
+                             mitigation=False, analysis=analysis,
+                             state_tom=False)
         exp_ls.append(curr_exp)
-    parallel_exp_ls = [ParallelExperiment(exp_ls[0: 63],
-                                          flatten_results=False),
-                       ParallelExperiment(exp_ls[63: len(exp_ls)],
-                                          flatten_results=False)]
+    parallel_exp_ls = [ParallelExperiment(exp_ls[start: end],
+                                          flatten_results=False)
+                       for start, end in group_bounds]
     batch_exp = BatchExperiment(parallel_exp_ls, flatten_results=False)
     return batch_exp
 
@@ -99,28 +158,13 @@ def parallel_exp_1q2q(qc_ls: list, backend, qubit_ls: list,
     # TODO: add a max_circuits options to expand the implementation of
     # experiments onto more qubits by submitting multiple runs to ibm.
 
-    exp_ls = []
     exp_ls = []
     for i in range(len(qc_ls)):
         curr_qc = qc_ls[i]
         curr_qubits_used = qubit_ls[i]
-        curr_exp = None
-        if mitigation and not state_tom:
-            curr_exp = MitigatedProcessTomography(curr_qc, backend,
-                                     physical_qubits=curr_qubits_used,
-                                     analysis=analysis)
-        elif not mitigation and not state_tom:
-            curr_exp = ProcessTomography(curr_qc, backend,
-                                     physical_qubits=curr_qubits_used,
-                                     analysis=analysis)
-        elif not mitigation and state_tom: 
-            curr_exp = StateTomography(curr_qc, backend,
-                                     physical_qubits=curr_qubits_used,
-                                     analysis=analysis)
-        elif mitigation and state_tom:
-            curr_exp = MitigatedStateTomography(curr_qc, backend,
-                                     physical_qubits=curr_qubits_used,
-                                     analysis=analysis)
+        curr_exp = _make_exp(curr_qc, backend, curr_qubits_used,
+                             mitigation=mitigation, analysis=analysis,
+                             state_tom=state_tom)
         exp_ls.append(curr_exp)
     parallel_exp = ParallelExperiment(exp_ls,
                                       flatten_results=False)
@@ -139,48 +183,50 @@ def gen_delay_circ_ls(num_qubits:int, num_maps: int, total_us_time:int, start_st
         num_qubits: number of qubits to execute the circuit on
         num_maps: number of delay circuits to generate
         total_us_time: total time in microseconds
+
+    The delays are evenly spaced, k*total_us_time/num_maps for k = 1..num_maps,
+    so the last circuit's delay is total_us_time.
     """
-    qc_ls = []
-    dt = round(total_us_time/num_maps,1)
-    t = dt
-    while t <= total_us_time:
-        base_qc = QuantumCircuit(num_qubits)
-        base_qc = prepare_state(base_qc, start_state)
-        base_qc.delay(t, unit='us')
-        qc_ls.append(base_qc)
-        t += dt
+    # delays are computed from k rather than an accumulated float sum, so
+    # exactly num_maps circuits are generated and none exceeds the total
+    dt = total_us_time/num_maps
+    times = [k*dt for k in range(1, num_maps+1)]
+    base_qc = QuantumCircuit(num_qubits)
+    base_qc = prepare_state(base_qc, num_qubits, start_state)
+    qc_ls = [None] * num_maps
+    for k, t in enumerate(times):
+        curr_qc = base_qc.copy()
+        curr_qc.delay(t, unit='us')
+        qc_ls[k] = curr_qc
     return qc_ls
 
 
+# gates applied to every qubit, in order, to prepare each start state
+_STATE_PREP_GATES = {
+    '0': (),
+    '1': ('x',),
+    '+': ('h',),
+    '-': ('x', 'h'),
+    '+i': ('h', 's'),
+    '-i': ('x', 'h', 's'),
+}
+
+
 def prepare_state(qc, num_qubits, start_state='0'):
     """
     Prepares the initial state of the circuit
     
     Args:
         qc: QuantumCircuit object
+        num_qubits: number of qubits to prepare
         start_state: desired initial state of the circuit
+
+    Returns:
+        qc with the state preparation gates appended
     """
-    if start_state == '0':
-        pass
-    elif start_state == '1':
-        for i in range(num_qubits):
-            qc.x(i)
-    elif start_state == '+':
-        for i in range(num_qubits):
-            qc.h(i)
-    elif start_state == '-':
-        for i in range(num_qubits):
-            qc.x(i)
-            qc.h(i)
-    elif start_state == '+i':
-        for i in range(num_qubits):
-            qc.h(i)
-            qc.s(i)
-    elif start_state == '-i':
-        for i in range(num_qubits):
-            qc.x(i)
-            qc.h(i)
-            qc.s(i)
-    else:
+    if start_state not in _STATE_PREP_GATES:
         raise ValueError("Invalid start state. Must be either '0', '1', '+', '-', '+i', or '-i'")
-    return qc
\ No newline at end of file
+    qubits = range(num_qubits)
+    for gate in _STATE_PREP_GATES[start_state]:
+        getattr(qc, gate)(qubits)
+    return qc
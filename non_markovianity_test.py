@@ -1,29 +1,42 @@
+from functools import lru_cache
 import numpy as np
-from scipy.linalg import sqrtm
-# from scympy import Matrix
-
-def trace_norm(matrix):
+try:
+    from numba import njit, prange
+except ImportError:
+    # without numba the kernels below run as plain python
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+def trace_norm(matrix, hermitian=False):
     """
     Calculate the trace norm of a matrix.
 
+    The trace norm is the sum of the singular values of the matrix, so a
+    single SVD replaces computing sqrtm(A.A^{dagger}). For Hermitian inputs
+    the singular values are the absolute eigenvalues, which eigvalsh gives
+    more cheaply.
+
     Args:
-        matrix (np.ndarray): The matrix to calculate the trace norm of.
+        matrix (np.ndarray): The matrix to calculate the trace norm of, or a
+            stack of matrices along the leading axes.
+        hermitian (bool): Whether the matrix is known to be Hermitian.
 
     Returns:
-        float: The trace norm of the matrix.
+        float: The trace norm of the matrix, or an array of them for a stack.
     """
-    temp = np.matmul(matrix,matrix.conj().T)
-    # hermitian and unitary matrices are always diagonalizable
-    return np.trace(sqrtm(temp))
-    # if Matrix(temp).is_diagonalizable():
-    #     return np.trace(sqrtm(temp))
-    # else:
-    #     raise Exception("input matrix A such that A.A^{dagger} is not diagonalizable")
+    if hermitian:
+        return np.abs(np.linalg.eigvalsh(matrix)).sum(axis=-1)
+    return np.linalg.svd(matrix, compute_uv=False).sum(axis=-1)
 
+@lru_cache(maxsize=8)
 def get_maximally_entagled_density_matrix(n):
     """
     Generate a maximally entangled density matrix of n qubits.
 
+    The result is cached per n and returned read-only, so callers must copy
+    it before modifying it.
+
     Args:
         n (int): The number of qubits.
 
@@ -31,15 +44,31 @@ def get_maximally_entagled_density_matrix(n):
         np.ndarray: The maximally entangled density matrix.
     """
     dim = 2**n
-    max_entangled_state = np.array([1/np.sqrt(dim)]*dim)
-    return np.outer(max_entangled_state.conj(), max_entangled_state)
+    # the state is real, so no conjugate is needed for the projector
+    max_entangled_state = np.full(dim, 1/np.sqrt(dim))
+    rho = np.multiply.outer(max_entangled_state, max_entangled_state)
+    rho.setflags(write=False)
+    return rho
+
+def apply_kraus_map(operators, rho, operators_dag=None):
+    """
+    Apply a map given by its Kraus operators to a density matrix,
+    sum_k K_k rho K_k^{dagger}, as a single contraction over the stack.
 
-def apply_kraus_map(operators, rho):
-    result = np.zeros(rho.shape, dtype=complex)
-    for op in operators:
-        op_dag = np.conjugate(np.transpose(op))
-        result += np.matmul(np.matmul(op, rho),op_dag)
-    return result
+    Args:
+        operators (np.ndarray): The Kraus operators, shape (k, d, d).
+        rho (np.ndarray): The density matrix, shape (d, d).
+        operators_dag (np.ndarray): The adjoints of the Kraus operators,
+            shape (k, d, d). Computed from operators if not given.
+
+    Returns:
+        np.ndarray: The transformed density matrix.
+    """
+    operators = np.asarray(operators)
+    if operators_dag is None:
+        operators_dag = operators.conj().transpose(0, 2, 1)
+    return np.einsum('kij,jl,klm->im', operators, rho, operators_dag,
+                     optimize='greedy')
 
 def get_extended_choi_matrix_operators(kraus_map):
     """
@@ -49,10 +78,17 @@ def get_extended_choi_matrix_operators(kraus_map):
         kraus_map (list): The Kraus operators of the map.
 
     Returns:
-        np.ndarray: The extended Choi matrix of the map.
+        np.ndarray: The extended Choi matrix operators I tensor K_k, shape (k, 2d, 2d).
+        np.ndarray: Their adjoints, in the same contiguous layout.
     """
-    identity = np.eye(2)
-    return np.array([np.kron(identity, op) for op in kraus_map])
+    # kron(I_2, op) is block diagonal with op on both diagonal blocks
+    kraus_arr = np.asarray(kraus_map)
+    n, d, _ = kraus_arr.shape
+    extended = np.zeros((n, 2*d, 2*d), dtype=kraus_arr.dtype)
+    extended[:, :d, :d] = kraus_arr
+    extended[:, d:, d:] = kraus_arr
+    extended_dag = np.ascontiguousarray(extended.conj().transpose(0, 2, 1))
+    return extended, extended_dag
 
 
 # First non-markovianity measure
@@ -79,22 +115,65 @@ def first_non_markovianity_measure(kraus_map_list, operating_qubits, delta_t):
         0 if markovian, else is non-markovian and quantifies how non-markovian the map is.
     """
     # using the choi matrix of the map (pg 261 of book)
+    if len(kraus_map_list) == 0:
+        return 0.0
     entagled_rho = get_maximally_entagled_density_matrix(operating_qubits+1)
-    G = 0
-    for kraus_map in kraus_map_list:
-        new_kraus_operators = get_extended_choi_matrix_operators(kraus_map)
-        new_rho = apply_kraus_map(new_kraus_operators, entagled_rho)
-        g = trace_norm(new_rho) - 1
-        G += g # integral sum
+    # stack the extended operators of every map and their adjoints into
+    # (T, k, 2d, 2d) tensors. Maps with fewer Kraus operators are padded with
+    # zero operators, which do not contribute to the sum
+    extended_ls = [get_extended_choi_matrix_operators(kraus_map)
+                   for kraus_map in kraus_map_list]
+    max_k = max(len(extended) for extended, _ in extended_ls)
+    dim = entagled_rho.shape[0]
+    kraus_arr = np.zeros((len(extended_ls), max_k, dim, dim), dtype=complex)
+    kraus_dag_arr = np.zeros_like(kraus_arr)
+    for t, (extended, extended_dag) in enumerate(extended_ls):
+        kraus_arr[t, :len(extended)] = extended
+        kraus_dag_arr[t, :len(extended)] = extended_dag
+    new_rho = np.einsum('tkij,jl,tklm->tim', kraus_arr, entagled_rho,
+                        kraus_dag_arr, optimize='greedy')
+    g = trace_norm(new_rho, hermitian=True) - 1
+    G = g.sum() # integral sum
     return G / (G + 1)
 
 
 #############################################
 
+@njit(cache=True)
+def _trace_distance_2x2(rho1, rho2):
+    # the Hermitian difference [[a, b], [b*, d]] has eigenvalues m +/- r with
+    # m = (a+d)/2 and r = sqrt(((a-d)/2)^2 + |b|^2), so half the sum of their
+    # absolute values is max(|m|, r)
+    diff = rho1 - rho2
+    m = 0.5 * (diff[0, 0] + diff[1, 1]).real
+    r = np.hypot(0.5 * (diff[0, 0] - diff[1, 1]).real, abs(diff[0, 1]))
+    return max(abs(m), r)
+
 def trace_distance(rho1, rho2):
+    """
+    Calculate the trace distance 0.5*||rho1 - rho2||_1 of two density matrices.
+
+    Single qubit states use the closed form of the eigenvalues of a 2x2
+    Hermitian matrix, larger states the eigenvalues of the difference.
+    """
     rho1 = np.array(rho1)
     rho2 = np.array(rho2)
-    return 0.5 * np.linalg.norm(rho1 - rho2, ord=1)
+    if rho1.shape == (2, 2):
+        return _trace_distance_2x2(rho1, rho2)
+    return 0.5 * np.abs(np.linalg.eigvalsh(rho1 - rho2)).sum()
+
+@njit(parallel=True, cache=True)
+def _second_non_markovian_2x2(states_arr):
+    # states_arr has shape (basis, time, pair, 2, 2)
+    n_basis, n = states_arr.shape[0], states_arr.shape[1]
+    basis_values = np.zeros(n_basis)
+    for basis in prange(n_basis):
+        before = _trace_distance_2x2(states_arr[basis, 0, 0], states_arr[basis, 0, 1])
+        for i in range(n-1):
+            after = _trace_distance_2x2(states_arr[basis, i+1, 0], states_arr[basis, i+1, 1])
+            basis_values[basis] += max(after - before, 0.) # derivative of trace distance
+            before = after
+    return basis_values.max()
 
 def second_non_markovian_helper_function(states):
     """
@@ -103,7 +182,15 @@ def second_non_markovian_helper_function(states):
     basis_states[i] are in some basis {X,Y,Z}
 
     states = [basis_states[X], basis_states[Y], basis_states[Z]]
+
+    Single qubit states sampled at the same number of times in every basis
+    are evaluated in a compiled loop.
     """
+    if len({len(basis_states) for basis_states in states}) == 1:
+        states_arr = np.array(states, dtype=np.complex128)
+        if states_arr.ndim == 5 and states_arr.shape[-3:] == (2, 2, 2):
+            return _second_non_markovian_2x2(states_arr)
+
     basis_values = [0,0,0] # basis values for [X,Y,Z]
 
     for basis, basis_states in enumerate(states):
@@ -1,4 +1,4 @@
-from qiskit.quantum_info import Choi, SuperOp
+from qiskit.quantum_info import SuperOp
 import numpy as np
 # from qiskit.circuit import QuantumCircuit
 
@@ -12,78 +12,105 @@ def extract_channel(experiment_data, vectorization):
     vectorization is true, output superoperator form.
 
     output:
-    proc_ls: list of process operators either in SuperOp or Choi representation
+    proc_ls: list of Choi process operators, or if vectorization is true a
+    (T, d, d) array of superoperator matrices
     '''
 
-    proc_ls = []
+    # only ask the result table for the value column of the 'state' result,
+    # instead of every default column of every result
     data_ls = experiment_data.child_data()
-    for i in range(len(data_ls)):
-        curr_choi = (data_ls[i].analysis_results(dataframe=True)['value']
-                     .iloc[0])
-        if vectorization:
-            curr_superop = SuperOp(curr_choi)
-            proc_ls.append(curr_superop)
-        else:
-            proc_ls.append(curr_choi)
+    choi_ls = [data.analysis_results('state', dataframe=True,
+                                     columns=['value']).iloc[0].value
+               for data in data_ls]
+    if vectorization:
+        proc_ls = np.stack([SuperOp(curr_choi).data for curr_choi in choi_ls])
+    else:
+        proc_ls = choi_ls
 
     return proc_ls
 
 
-def compute_intmdt_maps(superop_ls):
+def _superop_to_choi(superop_arr):
+
+    ''' reshuffles a (T, d^2, d^2) stack of superoperator matrices into
+    their Choi matrices, using the same column stacking convention as
+    qiskit's SuperOp and Choi
+    '''
+
+    num_maps, dim = superop_arr.shape[0], superop_arr.shape[-1]
+    d = int(round(np.sqrt(dim)))
+    superop_arr = superop_arr.reshape(num_maps, d, d, d, d)
+    return (superop_arr.transpose(0, 4, 2, 3, 1)
+            .reshape(num_maps, dim, dim))
+
+
+def compute_intmdt_maps(superop_arr):
 
     ''' computes list of intermediate maps from superoperator list
-    input: superop_ls: list of vectorized superoperators
+    input: superop_arr: (T, d, d) array of vectorized superoperators, or a
+    list of SuperOp
 
     We create a separate map that are products of maps up to the
     current index. Then multiply the two maps together to get a list
     of intermediate maps.
 
-    output: intmdt_map_ls: list of intermediate maps
+    output: intmdt_map_arr: (T, d, d) array of intermediate maps
 
     '''
-    dim = 2 ** (superop_ls[0].num_qubits * 2)
-    intmdt_map_ls = [0 for i in range(len(superop_ls))]
-    intmdt_map_ls[0] = superop_ls[0]
-    for i in range(1, len(superop_ls)):
-        curr_applied_inv = np.identity(dim)
-        for j in range(i):
-            curr_applied_inv = curr_applied_inv @ np.linalg.pinv(superop_ls[j])
-        intmdt_map_ls[i] = superop_ls[i] @ curr_applied_inv
-    return intmdt_map_ls
-
-
-def compute_Drhp(intmdt_map_ls, base_circ_time=90):
+    superop_arr = np.asarray(superop_arr, dtype=complex)
+    dim = superop_arr.shape[-1]
+    intmdt_map_arr = np.empty_like(superop_arr)
+    intmdt_map_arr[0] = superop_arr[0]
+    # the product of inverses up to i extends the one up to i-1 by a
+    # single factor. The pinvs are independent of each other, so they are
+    # computed in one stacked call over every map but the last
+    curr_applied_inv = np.identity(dim)
+    if len(superop_arr) > 1:
+        pinv_arr = np.linalg.pinv(superop_arr[:-1])
+    for i in range(1, len(superop_arr)):
+        curr_applied_inv = curr_applied_inv @ pinv_arr[i-1]
+        intmdt_map_arr[i] = superop_arr[i] @ curr_applied_inv
+    return intmdt_map_arr
+
+
+def compute_Drhp(intmdt_map_arr, base_circ_time=90):
     ''' compute normalized non-markovianity
     inputs:
-    intmdt_map_ls: list of intermediate maps
+    intmdt_map_arr: (T, d, d) array of intermediate superoperators
     base_circ_time: duration of the shortest circuit
 
     output: non-markovianity of the map built out of the list of intermediate
     maps
     '''
-    gt = []
-    for map in intmdt_map_ls:
-        gt.append((np.linalg.norm(Choi(map), ord=1) - 1))
-    Nrhp = sum(gt)
+    # g(t) uses the trace norm of the normalized Choi matrix, which is 1 for
+    # a CPTP intermediate map. The Choi matrix is Hermitian, so the trace
+    # norm is the sum of the absolute eigenvalues
+    choi_arr = _superop_to_choi(np.asarray(intmdt_map_arr, dtype=complex))
+    choi_arr = choi_arr / np.sqrt(choi_arr.shape[-1])
+    gt = np.abs(np.linalg.eigvalsh(choi_arr)).sum(axis=-1) - 1
+    Nrhp = gt.sum()
     Drhp = Nrhp / (1 + Nrhp)
     return Drhp
 
-def compute_intermediate_maps(final_evo_list, pseudo_inv=False):
+def compute_intermediate_maps(final_evo_arr, pseudo_inv=False):
     ''' computes the last intermediate map from the list of intermediate maps
     inputs:
-    phi_N: the last map of the sequence
-    intermediate_list: list of intermediate maps
+    final_evo_arr: (T, d, d) array of vectorized superoperators, as output
+    by extract_channel, or a list of SuperOp
 
-    output: the last intermediate map
+    output: (T, d, d) array of intermediate maps
     '''
-    dim = 2 ** (final_evo_list[0].num_qubits * 2)
+    final_evo_arr = np.asarray(final_evo_arr, dtype=complex)
+    dim = final_evo_arr.shape[-1]
     # first compute the intermediate maps 
-    intermediate_maps = []
-    intermediate_maps.append(final_evo_list[0])
-    for i in range(1, len(final_evo_list)):
-        curr_applied_inv = np.identity(dim)
-        for j in range(i):
-            curr_applied_inv = curr_applied_inv @ np.linalg.pinv(intermediate_maps[j])
-        intermediate_maps.append(final_evo_list[i] @ curr_applied_inv)
+    intermediate_maps = np.empty_like(final_evo_arr)
+    intermediate_maps[0] = final_evo_arr[0]
+    # the product of inverses up to i extends the one up to i-1 by the pinv
+    # of the map just computed. Each pinv depends on the previous step, so
+    # unlike compute_intmdt_maps they cannot be computed in one stacked call
+    curr_applied_inv = np.identity(dim)
+    for i in range(1, len(final_evo_arr)):
+        curr_applied_inv = curr_applied_inv @ np.linalg.pinv(intermediate_maps[i-1])
+        intermediate_maps[i] = final_evo_arr[i] @ curr_applied_inv
 
     return intermediate_maps